@@ -31,69 +31,97 @@ bl_info = {
 class OBJECT_OT_duplicate_hierarchy_base:
     """Base class for duplicate hierarchy operators"""
     
-    def get_all_children(self, obj, include_hidden=True):
-        """Recursively get all children of an object"""
-        children = []
-        for child in obj.children:
-            if include_hidden or not child.hide_get():
-                children.append(child)
-                children.extend(self.get_all_children(child, include_hidden))
-        return children
-    
-    def duplicate_with_selection_mapping(self, context, linked_data=False):
-        """Duplicate selected objects and their children while preserving selection mapping"""
-        # Store original selection and active object
-        original_selection = context.selected_objects.copy()
-        original_active = context.active_object
+    def build_children_map(self):
+        """Map each parent object to its direct children in a single pass
         
-        if not original_selection:
-            return None, "No valid objects selected"
-        
-        # Collect all objects to duplicate (selected objects + their children)
-        all_objects_to_duplicate = []
-        for obj in original_selection:
-            all_children = self.get_all_children(obj, include_hidden=True)
-            all_objects_to_duplicate.append(obj)
-            all_objects_to_duplicate.extend(all_children)
+        Object.children scans all of bpy.data.objects on every access.
+        """
+        children_map = {}
+        for obj in bpy.data.objects:
+            children_map.setdefault(obj.parent, []).append(obj)
+        return children_map
+    
+    def collect_hierarchies(self, roots, children_map):
+        """Get the roots and all of their children without duplicates
         
-        # Store original hide states and temporarily unhide all objects
+        Objects that were already collected are not traversed again, so
+        overlapping hierarchies are only walked once.
+        """
+        collected = {}
+        for root in roots:
+            if root in collected:
+                continue
+            collected[root] = None
+            stack = [root]
+            while stack:
+                for child in children_map.get(stack.pop(), ()):
+                    if child not in collected:
+                        collected[child] = None
+                        stack.append(child)
+        return list(collected)
+    
+    def build_layer_collection_map(self, view_layer):
+        """Map each collection to its layer collection in the view layer"""
+        layer_collection_map = {}
+        stack = [view_layer.layer_collection]
+        while stack:
+            layer_collection = stack.pop()
+            layer_collection_map[layer_collection.collection] = layer_collection
+            stack.extend(layer_collection.children)
+        return layer_collection_map
+    
+    def deselect_all(self, context):
+        """Deselect all objects without the overhead of the select_all operator"""
+        for obj in context.selected_objects:
+            obj.select_set(False)
+    
+    def needs_unhide(self, objects):
+        """Check whether any object is hidden or unselectable, directly or through its collections"""
+        return any(
+            obj.hide_viewport or obj.hide_select or not obj.visible_get()
+            or any(collection.hide_select for collection in obj.users_collection)
+            for obj in objects
+        )
+    
+    def unhide_objects(self, context, objects_to_unhide):
+        """Temporarily unhide objects and their collections, returning the original hide states"""
         original_object_hide_states = {}
         original_collection_hide_states = {}
         original_layer_collection_hide_states = {}
+        layer_collection_map = self.build_layer_collection_map(context.view_layer)
         
-        for obj in all_objects_to_duplicate:
-            original_object_hide_states[obj] = {
+        for obj in objects_to_unhide:
+            hide_state = {
                 'hide_get': obj.hide_get(),
                 'hide_viewport': obj.hide_viewport,
                 'hide_select': obj.hide_select
             }
-            obj.hide_set(False)
-            obj.hide_viewport = False
-            obj.hide_select = False
+            original_object_hide_states[obj] = hide_state
+            
+            # Assign through RNA so the view layer bases are resynced, and
+            # only where a flag is actually set
+            if hide_state['hide_get']:
+                obj.hide_set(False)
+            if hide_state['hide_viewport']:
+                obj.hide_viewport = False
+            if hide_state['hide_select']:
+                obj.hide_select = False
             
             # Also ensure collections containing the objects are visible
             for collection in obj.users_collection:
-                if collection not in original_collection_hide_states:
-                    original_collection_hide_states[collection] = {
-                        'hide_viewport': collection.hide_viewport,
-                        'hide_select': collection.hide_select
-                    }
-                    collection.hide_viewport = False
-                    collection.hide_select = False
+                # Collections shared by many objects only need handling once
+                if collection in original_collection_hide_states:
+                    continue
+                original_collection_hide_states[collection] = {
+                    'hide_viewport': collection.hide_viewport,
+                    'hide_select': collection.hide_select
+                }
+                collection.hide_viewport = False
+                collection.hide_select = False
                 
                 # Also ensure layer collections are visible
-                def find_layer_collection(layer_collection, target_collection):
-                    """Recursively find layer collection by collection reference"""
-                    if layer_collection.collection == target_collection:
-                        return layer_collection
-                    for child in layer_collection.children:
-                        result = find_layer_collection(child, target_collection)
-                        if result:
-                            return result
-                    return None
-                
-                layer_collection = find_layer_collection(context.view_layer.layer_collection, collection)
-                if layer_collection and layer_collection not in original_layer_collection_hide_states:
+                layer_collection = layer_collection_map.get(collection)
+                if layer_collection:
                     original_layer_collection_hide_states[layer_collection] = {
                         'hide_viewport': layer_collection.hide_viewport,
                         'exclude': layer_collection.exclude
@@ -101,48 +129,84 @@ class OBJECT_OT_duplicate_hierarchy_base:
                     layer_collection.hide_viewport = False
                     layer_collection.exclude = False
         
-        # Clear selection and select all objects to duplicate
-        bpy.ops.object.select_all(action='DESELECT')
-        copy_index = 0
-        copy_index_name = "__duplicate_hierarchy_copy_index"
-        for obj in all_objects_to_duplicate:
+        return original_object_hide_states, original_collection_hide_states, original_layer_collection_hide_states
+    
+    def select_and_duplicate(self, context, objects, active, linked_data=False):
+        """Select exactly the given objects and duplicate them, leaving the duplicates selected"""
+        self.deselect_all(context)
+        for obj in objects:
             obj.select_set(True)
-            obj[copy_index_name] = copy_index
-            copy_index += 1
+        context.view_layer.objects.active = active
         
-        # Set the first originally selected object as active
-        context.view_layer.objects.active = original_selection[0]
+        # Run in exec mode, the grab is started once at the end instead
+        bpy.ops.object.duplicate(linked=linked_data)
+    
+    def duplicate_single_root(self, context, root, objects_to_duplicate, linked_data=False):
+        """Duplicate a single visible hierarchy without hide state or selection bookkeeping"""
+        self.select_and_duplicate(context, objects_to_duplicate, root, linked_data)
         
-        # Duplicate all at once
-        if linked_data:
-            bpy.ops.object.duplicate('INVOKE_DEFAULT', False, linked=True)
+        # The duplicate of the active root becomes active, keep only it selected
+        dup_root = context.view_layer.objects.active
+        for dup_obj in context.selected_objects:
+            if dup_obj != dup_root:
+                dup_obj.select_set(False)
+    
+    def duplicate_with_hide_states(self, context, original_selection, original_active,
+                                   all_objects_to_duplicate, needs_unhide, linked_data=False):
+        """Duplicate hierarchies, restoring hide states and the selection pattern on the duplicates"""
+        # Store original hide states and temporarily unhide all objects.
+        # Skipped entirely in the common case where nothing is hidden.
+        if needs_unhide:
+            (original_object_hide_states,
+             original_collection_hide_states,
+             original_layer_collection_hide_states) = self.unhide_objects(
+                context, all_objects_to_duplicate)
         else:
-            bpy.ops.object.duplicate('INVOKE_DEFAULT', False)
-        
-        # Get the duplicated objects
-        duplicated_objects = context.selected_objects.copy()
+            original_object_hide_states = {}
+            original_collection_hide_states = {}
+            original_layer_collection_hide_states = {}
         
-        # Sort both list by the copy_index to ensure correct mapping
-        objects_to_duplicate_sorted = sorted(all_objects_to_duplicate, key=lambda obj: obj[copy_index_name])
-        duplicated_objects_sorted = sorted(duplicated_objects, key=lambda obj: obj[copy_index_name])
+        # Tag each object with its index so duplicates can be paired with
+        # their originals through the copied custom property
+        copy_index_name = "__duplicate_hierarchy_copy_index"
+        for copy_index, obj in enumerate(all_objects_to_duplicate):
+            obj[copy_index_name] = copy_index
         
-        # Create mapping from original to duplicated objects
         original_to_duplicated = {}
-        for orig_obj, dup_obj in zip(objects_to_duplicate_sorted, duplicated_objects_sorted):
-            original_to_duplicated[orig_obj] = dup_obj
-            del orig_obj[copy_index_name]
-            del dup_obj[copy_index_name]
+        try:
+            # Duplicate all at once, with the first originally selected object as active
+            self.select_and_duplicate(context, all_objects_to_duplicate, original_selection[0], linked_data)
+            
+            # Create mapping from original to duplicated objects by looking up
+            # the copy_index each duplicate inherited from its original
+            for dup_obj in context.selected_objects:
+                copy_index = dup_obj.pop(copy_index_name, None)
+                if copy_index is not None:
+                    original_to_duplicated[all_objects_to_duplicate[copy_index]] = dup_obj
+        finally:
+            # Never leave the tag behind on the originals
+            for orig_obj in all_objects_to_duplicate:
+                orig_obj.pop(copy_index_name, None)
         
-        # Set hide states for duplicated objects to match their originals
+        # Set hide states for duplicated objects to match their originals.
+        # Everything was unhidden above, so only hidden states need writing.
+        # The duplicate operator leaves only the duplicates selected, so the
+        # original selection pattern is applied to them in the same pass.
+        original_selection_set = set(original_selection)
         for orig_obj, dup_obj in original_to_duplicated.items():
+            if orig_obj not in original_selection_set:
+                dup_obj.select_set(False)
             if orig_obj in original_object_hide_states:
                 hide_state = original_object_hide_states[orig_obj]
-                orig_obj.hide_set(hide_state['hide_get'])
-                dup_obj.hide_set(hide_state['hide_get'])
-                orig_obj.hide_viewport = hide_state['hide_viewport']
-                dup_obj.hide_viewport = hide_state['hide_viewport']
-                orig_obj.hide_select = hide_state['hide_select']
-                dup_obj.hide_select = hide_state['hide_select']
+                if hide_state['hide_get']:
+                    orig_obj.hide_set(True)
+                    dup_obj.hide_set(True)
+                if hide_state['hide_viewport']:
+                    orig_obj.hide_viewport = True
+                    dup_obj.hide_viewport = True
+                if hide_state['hide_select']:
+                    orig_obj.hide_select = True
+                    dup_obj.hide_select = True
         
         # Restore original collection hide states
         for collection, states in original_collection_hide_states.items():
@@ -154,19 +218,31 @@ class OBJECT_OT_duplicate_hierarchy_base:
             layer_collection.hide_viewport = states['hide_viewport']
             layer_collection.exclude = states['exclude']
         
-        # Clear selection and apply original selection pattern to duplicated objects
-        bpy.ops.object.select_all(action='DESELECT')
-        
-        # Deselect all original objects and select corresponding duplicated objects
-        for orig_obj in original_selection:
-            orig_obj.select_set(False)
-            if orig_obj in original_to_duplicated:
-                dup_obj = original_to_duplicated[orig_obj]
-                dup_obj.select_set(True)
-        
         # Set active object to the duplicate of the original active object
         if original_active and original_active in original_to_duplicated:
             context.view_layer.objects.active = original_to_duplicated[original_active]
+    
+    def duplicate_with_selection_mapping(self, context, linked_data=False):
+        """Duplicate selected objects and their children while preserving selection mapping"""
+        # Store original selection and active object
+        original_selection = context.selected_objects.copy()
+        original_active = context.active_object
+        
+        if not original_selection:
+            return None, "No valid objects selected"
+        
+        # Collect all objects to duplicate (selected objects + their children)
+        children_map = self.build_children_map()
+        all_objects_to_duplicate = self.collect_hierarchies(original_selection, children_map)
+        
+        needs_unhide = self.needs_unhide(all_objects_to_duplicate)
+        
+        # A single visible hierarchy needs no hide state or selection mapping
+        if len(original_selection) == 1 and original_active == original_selection[0] and not needs_unhide:
+            self.duplicate_single_root(context, original_active, all_objects_to_duplicate, linked_data)
+        else:
+            self.duplicate_with_hide_states(context, original_selection, original_active,
+                                            all_objects_to_duplicate, needs_unhide, linked_data)
         
         # Start grab/move mode for the duplicated objects
         bpy.ops.transform.translate('INVOKE_DEFAULT', False)
@@ -214,22 +290,19 @@ class OBJECT_OT_duplicate_hierarchy_linked(OBJECT_OT_duplicate_hierarchy_base, O
         return {'FINISHED'}
 
 def menu_func(self, context):
-    self.layout.operator(OBJECT_OT_duplicate_hierarchy.bl_idname)
-
-def menu_func_linked(self, context):
-    self.layout.operator(OBJECT_OT_duplicate_hierarchy_linked.bl_idname)
+    layout = self.layout
+    layout.operator(OBJECT_OT_duplicate_hierarchy.bl_idname)
+    layout.operator(OBJECT_OT_duplicate_hierarchy_linked.bl_idname)
 
 def register():
     bpy.utils.register_class(OBJECT_OT_duplicate_hierarchy)
     bpy.utils.register_class(OBJECT_OT_duplicate_hierarchy_linked)
     bpy.types.VIEW3D_MT_object.append(menu_func)
-    bpy.types.VIEW3D_MT_object.append(menu_func_linked)
 
 def unregister():
     bpy.utils.unregister_class(OBJECT_OT_duplicate_hierarchy)
     bpy.utils.unregister_class(OBJECT_OT_duplicate_hierarchy_linked)
     bpy.types.VIEW3D_MT_object.remove(menu_func)
-    bpy.types.VIEW3D_MT_object.remove(menu_func_linked)
 
 if __name__ == "__main__":
     register()
\ No newline at end of file